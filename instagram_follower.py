@@ -5,14 +5,25 @@ Follow followers of target accounts and specific accounts
 Production-ready with persistent caching
 """
 
+import argparse
+import functools
 import json
+import math
 import time
 import random
 import logging
 import os
+import re
+import sqlite3
+import threading
+import atexit
+import pickle
+import itertools
+import collections
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Tuple
 from instagrapi import Client
 from instagrapi.exceptions import (
     LoginRequired,
@@ -21,6 +32,16 @@ from instagrapi.exceptions import (
     ClientError
 )
 
+try:
+    import orjson  # Optional: much faster parsing of large legacy caches
+except ImportError:
+    orjson = None
+
+try:
+    from pybloom_live import ScalableBloomFilter  # Optional: compact index for huge caches
+except ImportError:
+    ScalableBloomFilter = None
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,76 +50,321 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Profiles fetched per vetting batch
+USER_INFO_BATCH_SIZE = 50
+
+# Followers requested per pagination call
+FOLLOWERS_PAGE_SIZE = 100
+
+
+def _chunked(items: List, size: int):
+    """Yield successive chunks of at most size items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _load_json(path: str):
+    """Load a JSON file, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _epoch(timestamp) -> Optional[float]:
+    """Convert a legacy ISO-8601 cache timestamp to epoch seconds."""
+    if isinstance(timestamp, str):
+        return datetime.fromisoformat(timestamp).timestamp()
+    return timestamp
+
+
+# How long each status keeps a user out of the candidate pool (seconds);
+# statuses not listed never expire
+STATUS_TTL = {
+    "failed": 24 * 60 * 60,
+    "skipped": 7 * 24 * 60 * 60,
+}
+
+
+def _expires_at(status: str, timestamp: float) -> Optional[float]:
+    """Expiry time for a cache entry, or None if it never expires."""
+    ttl = STATUS_TTL.get(status)
+    return None if ttl is None else timestamp + ttl
+
+
+def _vet(user_info, min_followers: float, max_followers: float,
+         skip_private: bool, skip_business: bool) -> Optional[str]:
+    """Check a full profile against the follow criteria.
+
+    Returns the reason the user should be skipped, or None if they qualify.
+    """
+    follower_count, is_private, is_business = (
+        user_info.follower_count, user_info.is_private, user_info.is_business
+    )
+    if skip_private and is_private:
+        return "private account"
+    if follower_count < min_followers:
+        return f"too few followers ({follower_count})"
+    if follower_count > max_followers:
+        return f"too many followers ({follower_count})"
+    if skip_business and is_business:
+        return "business account"
+    return None
+
+
 class FollowCache:
-    """Persistent cache to track all follow attempts."""
+    """Persistent cache to track all follow attempts.
+
+    Entries are stored in a SQLite database next to the configured cache
+    file; a legacy JSON cache at that path is migrated on first use.
+    """
 
     def __init__(self, cache_file: str = "follow_cache.json"):
         self.cache_file = cache_file
-        self.cache: Dict[str, dict] = {}
-        self._load_cache()
-
-    def _load_cache(self):
-        """Load cache from disk."""
-        if os.path.exists(self.cache_file):
+        self.db_file = str(Path(cache_file).with_suffix(".db"))
+        # Shared with the background flusher; every use goes through _lock
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS follows ("
+            "user_id INTEGER PRIMARY KEY, username TEXT, status TEXT, "
+            "source TEXT, ts REAL, attempts INTEGER, expires_at REAL)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(follows)")}
+        if "expires_at" not in columns:
+            self.conn.execute("ALTER TABLE follows ADD COLUMN expires_at REAL")
+        self.conn.commit()
+        self._migrate_json()
+
+        # In-memory index so membership checks skip the database; built on
+        # first lookup so stats/retry commands never load every id
+        self.bloom_file = self.db_file + ".bloom"
+        self._bloom = None
+        self._expires: Optional[Dict[int, float]] = None
+        self._index_ready = False
+
+        # Coalesce writes: add_user leaves its transaction open and a
+        # background thread commits at most once per second
+        self._flush_interval = 1.0
+        threading.Thread(target=self._flusher, daemon=True).start()
+        atexit.register(self._close)
+
+    def _flusher(self):
+        """Periodically commit pending cache writes."""
+        while True:
+            time.sleep(self._flush_interval)
+            if self._dirty:
+                self._flush_now()
+
+    def _flush_now(self):
+        """Commit pending cache writes immediately."""
+        with self._lock:
+            if not self._dirty:
+                return
             try:
-                with open(self.cache_file, 'r') as f:
-                    self.cache = json.load(f)
-                logger.info(f"Loaded {len(self.cache)} users from cache")
-            except Exception as e:
-                logger.error(f"Error loading cache: {e}")
-                self.cache = {}
+                self.conn.commit()
+                self._dirty = False
+            except sqlite3.Error as e:
+                logger.error(f"Error saving cache: {e}")
+
+    def _load_index(self):
+        """Build the in-memory membership index.
+
+        With pybloom_live installed a Bloom filter answers most lookups and
+        only possible hits go to SQLite; otherwise all ids are kept in a dict
+        mapping to their expiry time.
+        """
+        if ScalableBloomFilter is not None:
+            self._bloom = self._load_bloom()
         else:
-            self.cache = {}
+            with self._lock:
+                self._expires = {
+                    user_id: math.inf if expires_at is None else expires_at
+                    for user_id, expires_at in self.conn.execute(
+                        "SELECT user_id, expires_at FROM follows"
+                    )
+                }
+        self._index_ready = True
+
+    def _close(self):
+        """Flush pending writes and persist the Bloom filter."""
+        self._flush_now()
+        if self._bloom is not None:
+            self._save_bloom()
+
+    def _fingerprint(self) -> tuple:
+        """Cheap summary of the stored ids, used to detect a stale Bloom file."""
+        with self._lock:
+            return tuple(self.conn.execute("SELECT COUNT(*), TOTAL(user_id) FROM follows").fetchone())
+
+    def _load_bloom(self):
+        """Load the persisted Bloom filter, rebuilding it if it is missing or stale."""
+        try:
+            with open(self.bloom_file, 'rb') as f:
+                fingerprint, bloom = pickle.load(f)
+            if fingerprint == self._fingerprint():
+                return bloom
+        except Exception as e:
+            logger.debug(f"Rebuilding Bloom filter: {e}")
 
-    def _save_cache(self):
-        """Save cache to disk."""
+        bloom = ScalableBloomFilter(initial_capacity=100000, error_rate=0.001)
+        with self._lock:
+            rows = self.conn.execute("SELECT user_id FROM follows").fetchall()
+        for (user_id,) in rows:
+            bloom.add(user_id)
+        return bloom
+
+    def _save_bloom(self):
+        """Persist the Bloom filter so the next start can skip rebuilding it."""
+        try:
+            tmp_file = self.bloom_file + ".tmp"
+            with open(tmp_file, 'wb') as f:
+                pickle.dump((self._fingerprint(), self._bloom), f)
+            os.replace(tmp_file, self.bloom_file)
+        except OSError as e:
+            logger.error(f"Error saving Bloom filter: {e}")
+
+    def _migrate_json(self):
+        """One-shot import of a legacy JSON cache into SQLite."""
+        if self.cache_file == self.db_file or not os.path.exists(self.cache_file):
+            return
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.cache, f, indent=2)
+            legacy = _load_json(self.cache_file)
+            rows = []
+            for uid, data in legacy.items():
+                ts = _epoch(data.get("timestamp"))
+                rows.append((
+                    int(uid), data.get("username"), data.get("status"), data.get("source", ""),
+                    ts, data.get("attempts", 1), _expires_at(data.get("status"), ts or time.time())
+                ))
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO follows "
+                    "(user_id, username, status, source, ts, attempts, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            os.replace(self.cache_file, self.cache_file + ".migrated")
+            logger.info(f"Migrated {len(rows)} users from {self.cache_file} to {self.db_file}")
         except Exception as e:
-            logger.error(f"Error saving cache: {e}")
+            logger.error(f"Error migrating cache: {e}")
 
     def is_processed(self, user_id: int) -> bool:
-        """Check if user has been processed before."""
-        return str(user_id) in self.cache
+        """Check if user has been processed before and the entry has not expired."""
+        if not self._index_ready:
+            self._load_index()
+        user_id = int(user_id)
+        if self._bloom is None:
+            return self._expires.get(user_id, 0) > time.time()
+        if user_id not in self._bloom:
+            return False
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM follows WHERE user_id = ? "
+                "AND (expires_at IS NULL OR expires_at > ?) LIMIT 1",
+                (user_id, time.time())
+            ).fetchone()
+        return row is not None
 
     def add_user(self, user_id: int, username: str, status: str, source: str = ""):
         """Add user to cache with metadata."""
-        self.cache[str(user_id)] = {
-            "username": username,
-            "status": status,  # "followed", "failed", "skipped", "already_following"
-            "source": source,  # target account or "specific"
-            "timestamp": datetime.now().isoformat(),
-            "attempts": self.cache.get(str(user_id), {}).get("attempts", 0) + 1
-        }
-        self._save_cache()
+        # status: "followed", "failed", "skipped", "already_following"
+        # source: target account or "specific"
+        now = time.time()
+        expires_at = _expires_at(status, now)
+        if self._bloom is not None:
+            self._bloom.add(int(user_id))
+        elif self._expires is not None:
+            self._expires[int(user_id)] = math.inf if expires_at is None else expires_at
+        try:
+            with self._lock:
+                self.conn.execute(
+                    "INSERT INTO follows (user_id, username, status, source, ts, attempts, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, 1, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, "
+                    "status = excluded.status, source = excluded.source, ts = excluded.ts, "
+                    "attempts = attempts + 1, expires_at = excluded.expires_at",
+                    (int(user_id), username, status, source, now, expires_at)
+                )
+                self._dirty = True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving cache: {e}")
 
     def get_user(self, user_id: int) -> Optional[dict]:
         """Get user info from cache."""
-        return self.cache.get(str(user_id))
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT username, status, source, ts, attempts FROM follows WHERE user_id = ?",
+                (int(user_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("username", "status", "source", "timestamp", "attempts"), row))
 
     def get_stats(self) -> dict:
         """Get cache statistics."""
-        stats = {
-            "total": len(self.cache),
-            "followed": 0,
-            "failed": 0,
-            "skipped": 0,
-            "already_following": 0
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM follows GROUP BY status").fetchall()
+        counts = collections.Counter(dict(rows))
+        return {
+            "total": sum(counts.values()),
+            "followed": counts["followed"],
+            "failed": counts["failed"],
+            "skipped": counts["skipped"],
+            "already_following": counts["already_following"]
         }
-        for user_data in self.cache.values():
-            status = user_data.get("status", "unknown")
-            if status in stats:
-                stats[status] += 1
-        return stats
 
     def clear_failed(self):
         """Clear failed attempts to retry them."""
-        to_remove = [uid for uid, data in self.cache.items() if data.get("status") == "failed"]
-        for uid in to_remove:
-            del self.cache[uid]
-        self._save_cache()
-        logger.info(f"Cleared {len(to_remove)} failed entries from cache")
+        with self._lock, self.conn:
+            failed = [user_id for (user_id,) in self.conn.execute(
+                "SELECT user_id FROM follows WHERE status = 'failed'"
+            )]
+            self.conn.execute("DELETE FROM follows WHERE status = 'failed'")
+            self._dirty = False
+        if self._expires is not None:
+            for user_id in failed:
+                self._expires.pop(user_id, None)
+        logger.info(f"Cleared {len(failed)} failed entries from cache")
+
+    def vacuum(self):
+        """Drop entries whose retry window has passed."""
+        now = time.time()
+        with self._lock, self.conn:
+            removed = self.conn.execute(
+                "DELETE FROM follows WHERE expires_at < ?", (now,)
+            ).rowcount
+            self._dirty = False
+        if self._expires is not None:
+            self._expires = {uid: exp for uid, exp in self._expires.items() if exp >= now}
+        if removed:
+            logger.info(f"Removed {removed} expired entries from cache")
+
+
+class TokenBucket:
+    """Token-bucket rate limiter allowing short bursts at a bounded average rate."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate  # tokens per second
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    def acquire(self, n: float = 1):
+        """Take n tokens, sleeping until enough have been refilled."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens < n:
+            time.sleep((n - self.tokens) / self.rate)
+            self.last_refill = time.monotonic()
+            self.tokens = 0
+        else:
+            self.tokens -= n
 
 
 class InstagramFollowerBot:
@@ -107,18 +373,59 @@ class InstagramFollowerBot:
         self.config = self._load_config(config_path)
         self.client = Client()
         self.session_file = self.config["settings"].get("session_file", "session.json")
-        cache_file = self.config["settings"].get("cache_file", "follow_cache.json")
-        self.cache = FollowCache(cache_file)
 
-        # Show cache stats on startup
-        stats = self.cache.get_stats()
-        logger.info(f"Cache stats: {stats['total']} total, {stats['followed']} followed, "
-                   f"{stats['skipped']} skipped, {stats['failed']} failed")
+        # Vetting and delay settings are read once here rather than per candidate
+        settings = self.config["settings"]
+        self._min_followers = settings.get("min_followers", 0)
+        self._max_followers = settings.get("max_followers", float('inf'))
+        self._check_follower_count = "min_followers" in settings or "max_followers" in settings
+        self._skip_private = bool(settings.get("skip_private_accounts"))
+        self._skip_business = bool(settings.get("skip_business_accounts"))
+        # All blacklist substrings compiled into one pattern; (?!) never matches
+        self._blacklist_re = re.compile(
+            "|".join(re.escape(p) for p in settings.get("username_blacklist", []) if p) or r"(?!)",
+            re.IGNORECASE
+        )
+        self._min_delay = settings["delay_between_follows_min"]
+        self._max_delay = settings["delay_between_follows_max"]
+        self._rng = random.Random()
+        self._jitter = collections.deque()
+
+        # Exponential backoff state for rate-limit responses
+        self._backoff_n = 0
+        self._backoff_base = 60
+        self._backoff_max = 900
+
+        # Per-endpoint rate limiters. follow_bucket is a hard floor: no two
+        # follow attempts (including failed ones, which skip _delay) are ever
+        # closer than delay_between_follows_min. _delay provides the
+        # randomized min..max spacing after successful follows.
+        self.follow_bucket = TokenBucket(capacity=1, rate=1 / max(self._min_delay, 1))
+        self.info_bucket = TokenBucket(capacity=10, rate=1 / 3)
+
+        # instagrapi's Client is not thread-safe (responses land in shared
+        # attributes), so each lookup worker gets its own Client
+        self._worker_local = threading.local()
+        self._cache_file = self.config["settings"].get("cache_file", "follow_cache.json")
+
+    @functools.cached_property
+    def _info_executor(self) -> ThreadPoolExecutor:
+        """Long-lived lookup pool so worker clients are reused across batches.
+
+        Each worker's Client keeps its own requests session, so its
+        keep-alive connections are reused for every lookup that thread makes.
+        """
+        max_workers = self.config["settings"].get("info_workers", 6)
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    @functools.cached_property
+    def cache(self) -> FollowCache:
+        """Follow cache, opened on first use so utility commands start quickly."""
+        return FollowCache(self._cache_file)
 
     def _load_config(self, config_path: str) -> dict:
         """Load configuration from JSON file."""
-        with open(config_path, 'r') as f:
-            return json.load(f)
+        return _load_json(config_path)
 
     def login(self) -> bool:
         """Login to Instagram with session persistence."""
@@ -157,16 +464,91 @@ class InstagramFollowerBot:
             return False
 
     def _delay(self):
-        """Random delay between actions to avoid detection."""
-        min_delay = self.config["settings"]["delay_between_follows_min"]
-        max_delay = self.config["settings"]["delay_between_follows_max"]
-        delay = random.uniform(min_delay, max_delay)
-        logger.info(f"Waiting {delay:.1f} seconds...")
+        """Random delay between follows to avoid detection."""
+        if not self._jitter:
+            self._refill_jitter()
+        delay = self._jitter.popleft()
+        logger.debug("Waiting %.1f seconds...", delay)
         time.sleep(delay)
 
-    def _should_follow_user(self, user_info, source: str = "") -> bool:
-        """Check if user meets criteria for following."""
-        settings = self.config["settings"]
+    def _refill_jitter(self, n: int = 256):
+        """Precompute a batch of randomized follow delays."""
+        uniform = self._rng.uniform
+        self._jitter.extend(uniform(self._min_delay, self._max_delay) for _ in range(n))
+
+    def _backoff(self):
+        """Exponential backoff with jitter after a rate-limit response."""
+        wait = min(self._backoff_base * (2 ** self._backoff_n), self._backoff_max)
+        wait += random.uniform(0, 30)
+        logger.warning(f"Rate limited! Backing off {wait:.0f} seconds...")
+        time.sleep(wait)
+        self._backoff_n += 1
+
+    def _fetch_user_infos(self, user_ids: List[int]) -> Dict[int, object]:
+        """Fetch full profiles for many users, keyed by user id.
+
+        Users whose lookup fails are left out of the result. A rate-limit
+        response cancels the remaining lookups and is re-raised.
+        """
+        infos = {}
+
+        # Profile reads run concurrently; follows stay serial
+        rate_limited = threading.Event()
+
+        def lookup(user_id):
+            try:
+                return self._worker_user_info(user_id)
+            except PleaseWaitFewMinutes:
+                rate_limited.set()
+                raise
+
+        futures = {}
+        for user_id in user_ids:
+            if rate_limited.is_set():
+                break  # Stop submitting; the error is re-raised below
+            self.info_bucket.acquire()
+            futures[self._info_executor.submit(lookup, user_id)] = user_id
+        for future in as_completed(futures):
+            user_id = futures[future]
+            try:
+                info = future.result()
+            except PleaseWaitFewMinutes:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            except Exception as e:
+                logger.warning(f"Error fetching user {user_id}: {e}")
+                continue
+            if str(info.pk) != str(user_id):
+                logger.warning(f"Discarding profile {info.pk} returned for user {user_id}")
+                continue
+            infos[user_id] = info
+        return infos
+
+    def _worker_user_info(self, user_id: int):
+        """Fetch a profile with this thread's own Client."""
+        client = getattr(self._worker_local, "client", None)
+        if client is None:
+            client = Client(settings=self.client.get_settings())
+            self._worker_local.client = client
+        return client.user_info(user_id)
+
+    def _needs_full_info(self, user_info) -> bool:
+        """Check if vetting this user requires the full profile."""
+        if self._skip_private and user_info.is_private:
+            return False  # Skipped from the light object alone
+        return (
+            self._check_follower_count
+            or self._skip_business
+            or (self._skip_private and user_info.is_private is None)
+        )
+
+    def _should_follow_user(self, user_info, fetch_full: Callable[[], object], source: str = "") -> bool:
+        """Check if user meets criteria for following.
+
+        Checks that can be answered from the light follower object run first;
+        the full profile is only fetched via fetch_full when a criterion needs it.
+        """
         user_id = user_info.pk
         username = user_info.username
 
@@ -176,39 +558,50 @@ class InstagramFollowerBot:
             logger.debug(f"Skipping {username}: already in cache (status: {cached['status']})")
             return False
 
-        # Check follower count criteria
-        follower_count = user_info.follower_count
-        if follower_count < settings.get("min_followers", 0):
-            logger.debug(f"Skipping {username}: too few followers ({follower_count})")
-            self.cache.add_user(user_id, username, "skipped", source)
-            return False
-        if follower_count > settings.get("max_followers", float('inf')):
-            logger.debug(f"Skipping {username}: too many followers ({follower_count})")
-            self.cache.add_user(user_id, username, "skipped", source)
-            return False
-
-        # Check private account
-        if settings.get("skip_private_accounts") and user_info.is_private:
+        # Check private account (included in follower listings)
+        if self._skip_private and user_info.is_private:
             logger.debug(f"Skipping {username}: private account")
             self.cache.add_user(user_id, username, "skipped", source)
             return False
 
-        # Check business account
-        if settings.get("skip_business_accounts") and user_info.is_business:
-            logger.debug(f"Skipping {username}: business account")
+        if not self._needs_full_info(user_info):
+            return True
+
+        reason = _vet(
+            fetch_full(), self._min_followers, self._max_followers,
+            self._skip_private, self._skip_business
+        )
+        if reason is not None:
+            logger.debug(f"Skipping {username}: {reason}")
             self.cache.add_user(user_id, username, "skipped", source)
             return False
 
         return True
 
+    def _is_following(self, user_id: int) -> bool:
+        """Check whether the logged-in account already follows user_id."""
+        try:
+            self.info_bucket.acquire()
+            return bool(self.client.user_friendship_v1(user_id).following)
+        except ClientError as e:
+            logger.debug(f"Error checking friendship with {user_id}: {e}")
+            return False
+
     def follow_user(self, user_id: int, username: str, source: str = "") -> bool:
         """Follow a single user."""
         try:
+            self.follow_bucket.acquire()
             result = self.client.user_follow(user_id)
             if result:
+                self._backoff_n = 0
                 self.cache.add_user(user_id, username, "followed", source)
                 logger.info(f"Successfully followed: {username}")
                 return True
+            elif self._is_following(user_id):
+                # instagrapi returns False for accounts that are already followed
+                self.cache.add_user(user_id, username, "already_following", source)
+                logger.info(f"Already following: {username}")
+                return False
             else:
                 self.cache.add_user(user_id, username, "failed", source)
                 logger.warning(f"Failed to follow: {username}")
@@ -216,13 +609,15 @@ class InstagramFollowerBot:
 
         except PleaseWaitFewMinutes as e:
             self.cache.add_user(user_id, username, "failed", source)
-            logger.warning(f"Rate limited! Waiting 5 minutes... ({e})")
-            time.sleep(300)
+            logger.warning(f"Rate limited while following {username}: {e}")
+            self._backoff()
             return False
 
         except ClientError as e:
             self.cache.add_user(user_id, username, "failed", source)
             logger.error(f"Error following {username}: {e}")
+            if getattr(getattr(e, "response", None), "status_code", None) == 429:
+                self._backoff()
             return False
 
     def follow_specific_accounts(self, accounts: List[str]) -> int:
@@ -232,6 +627,7 @@ class InstagramFollowerBot:
         for username in accounts:
             try:
                 logger.info(f"Looking up user: {username}")
+                self.info_bucket.acquire()
                 user_id = self.client.user_id_from_username(username)
 
                 # Check cache first
@@ -240,14 +636,8 @@ class InstagramFollowerBot:
                     logger.info(f"Skipping {username}: already processed (status: {cached['status']})")
                     continue
 
-                user_info = self.client.user_info(user_id)
-
-                # Check if already following on Instagram
-                if user_info.following:
-                    logger.info(f"Already following: {username}")
-                    self.cache.add_user(user_id, username, "already_following", "specific")
-                    continue
-
+                # follow_user records existing follows as "already_following",
+                # so no separate profile lookup is needed here
                 if self.follow_user(user_id, username, "specific"):
                     followed_count += 1
                     self._delay()
@@ -259,61 +649,92 @@ class InstagramFollowerBot:
 
         return followed_count
 
-    def follow_account_followers(self, target_username: str, max_to_follow: Optional[int] = None) -> int:
-        """Follow followers of a target account."""
-        if max_to_follow is None:
-            max_to_follow = self.config["settings"]["max_followers_to_follow"]
-
+    def _process_follower(self, follower_id: int, follower_info, fetch_full: Callable[[], object],
+                          source: str) -> bool:
+        """Vet a single follower and follow them if they qualify."""
         try:
-            # Get target account info
-            logger.info(f"Getting followers of: {target_username}")
-            user_id = self.client.user_id_from_username(target_username)
-
-            # Get more followers than needed to account for cached/skipped users
-            fetch_amount = max_to_follow * 3
-            followers = self.client.user_followers(user_id, amount=fetch_amount)
-            logger.info(f"Found {len(followers)} followers")
+            if not self._should_follow_user(follower_info, fetch_full, source):
+                return False
 
-            followed_count = 0
-            processed_count = 0
+            if self.follow_user(follower_id, follower_info.username, source):
+                self._delay()
+                return True
+            return False
 
-            for follower_id, follower_info in followers.items():
-                if followed_count >= max_to_follow:
-                    logger.info(f"Reached maximum follow limit: {max_to_follow}")
-                    break
+        except Exception as e:
+            logger.error(f"Error processing follower {follower_info.username}: {e}")
+            return False
 
-                # Quick cache check before API call
-                if self.cache.is_processed(follower_id):
-                    cached = self.cache.get_user(follower_id)
-                    logger.debug(f"Skipping {follower_info.username}: in cache (status: {cached['status']})")
-                    continue
+    def _follow_followers_page(self, page: List, source: str, limit: int) -> Tuple[int, int]:
+        """Vet and follow users from one page of followers.
+
+        Returns (followed, processed) counts, following at most limit users.
+        """
+        # Drop cached and blacklisted users before any profile lookups
+        ready = []
+        candidates = []
+        for follower_info in page:
+            username = follower_info.username
+            if self.cache.is_processed(follower_info.pk):
+                cached = self.cache.get_user(follower_info.pk)
+                logger.debug(f"Skipping {username}: in cache (status: {cached['status']})")
+                continue
+            if username and self._blacklist_re.search(username):
+                logger.debug(f"Skipping {username}: blacklisted username")
+                self.cache.add_user(follower_info.pk, username, "skipped", source)
+                continue
+            if self._needs_full_info(follower_info):
+                candidates.append(follower_info)
+            else:
+                ready.append(follower_info)
 
+        followed_count = 0
+        processed_count = 0
+        # Profiles are fetched one batch at a time so a met quota wastes at most one batch
+        batches = itertools.chain(
+            [(ready, False)],
+            ((chunk, True) for chunk in _chunked(candidates, USER_INFO_BATCH_SIZE))
+        )
+        for batch, needs_full in batches:
+            if followed_count >= limit:
+                break
+            full_infos = {}
+            if needs_full:
+                # Vetting below reads from this dict without further network I/O
                 try:
-                    processed_count += 1
-
-                    # Get full user info for criteria check
-                    full_info = self.client.user_info(follower_id)
+                    full_infos = self._fetch_user_infos([info.pk for info in batch])
+                except PleaseWaitFewMinutes as e:
+                    logger.warning(f"Rate limited while looking up followers: {e}")
+                    self._backoff()
+                    break
 
-                    # Check if already following on Instagram
-                    if full_info.following:
-                        logger.debug(f"Already following: {follower_info.username}")
-                        self.cache.add_user(follower_id, follower_info.username, "already_following", target_username)
-                        continue
+            for follower_info in batch:
+                if followed_count >= limit:
+                    break
 
-                    if not self._should_follow_user(full_info, target_username):
-                        continue
+                follower_id = follower_info.pk
+                if needs_full and follower_id not in full_infos:
+                    # Lookup failed; leave uncached so a later run retries it
+                    logger.debug(f"Skipping {follower_info.username}: profile unavailable")
+                    continue
 
-                    if self.follow_user(follower_id, follower_info.username, target_username):
-                        followed_count += 1
-                        self._delay()
+                processed_count += 1
+                fetch_full = functools.partial(full_infos.__getitem__, follower_id)
+                if self._process_follower(follower_id, follower_info, fetch_full, source):
+                    followed_count += 1
 
-                except Exception as e:
-                    logger.error(f"Error processing follower {follower_info.username}: {e}")
-                    continue
+        return followed_count, processed_count
 
-            logger.info(f"Processed {processed_count} users, followed {followed_count}")
-            return followed_count
+    def follow_account_followers(self, target_username: str, max_to_follow: Optional[int] = None) -> int:
+        """Follow followers of a target account."""
+        if max_to_follow is None:
+            max_to_follow = self.config["settings"]["max_followers_to_follow"]
 
+        try:
+            # Get target account info
+            logger.info(f"Getting followers of: {target_username}")
+            self.info_bucket.acquire()
+            user_id = self.client.user_id_from_username(target_username)
         except UserNotFound:
             logger.error(f"Target account not found: {target_username}")
             return 0
@@ -321,12 +742,51 @@ class InstagramFollowerBot:
             logger.error(f"Error getting followers of {target_username}: {e}")
             return 0
 
+        followed_count = 0
+        processed_count = 0
+        next_max_id = ""
+
+        # Page through followers lazily and stop as soon as the quota is met
+        while followed_count < max_to_follow:
+            try:
+                self.info_bucket.acquire()
+                page, next_max_id = self.client.user_followers_v1_chunk(
+                    user_id, max_amount=FOLLOWERS_PAGE_SIZE, max_id=next_max_id
+                )
+            except PleaseWaitFewMinutes as e:
+                logger.warning(f"Rate limited while fetching followers of {target_username}: {e}")
+                self._backoff()
+                break
+            except Exception as e:
+                logger.error(f"Error getting followers of {target_username}: {e}")
+                break
+            logger.info(f"Fetched {len(page)} followers")
+
+            followed, processed = self._follow_followers_page(
+                page, target_username, max_to_follow - followed_count
+            )
+            followed_count += followed
+            processed_count += processed
+
+            if not next_max_id:
+                break
+
+        if followed_count >= max_to_follow:
+            logger.info(f"Reached maximum follow limit: {max_to_follow}")
+        logger.info(f"Processed {processed_count} users, followed {followed_count}")
+        return followed_count
+
     def run(self):
         """Main execution method."""
         if not self.login():
             logger.error("Failed to login. Exiting.")
             return
 
+        self.cache.vacuum()
+        stats = self.cache.get_stats()
+        logger.info(f"Cache stats: {stats['total']} total, {stats['followed']} followed, "
+                   f"{stats['skipped']} skipped, {stats['failed']} failed")
+
         total_followed = 0
 
         # Follow specific accounts first
@@ -371,10 +831,8 @@ class InstagramFollowerBot:
         self.cache.clear_failed()
 
 
-def main():
-    """Main entry point."""
-    import argparse
-
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
     parser = argparse.ArgumentParser(description="Instagram Follower Automation")
     parser.add_argument("--config", default="config.json", help="Path to config file")
     parser.add_argument("--target", help="Target account to follow followers of")
@@ -382,8 +840,15 @@ def main():
     parser.add_argument("--max", type=int, help="Maximum users to follow")
     parser.add_argument("--stats", action="store_true", help="Show cache statistics")
     parser.add_argument("--retry-failed", action="store_true", help="Clear failed entries to retry")
+    return parser
+
+
+_PARSER = _build_parser()
 
-    args = parser.parse_args()
+
+def main():
+    """Main entry point."""
+    args = _PARSER.parse_args()
 
     bot = InstagramFollowerBot(args.config)
 
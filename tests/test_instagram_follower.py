@@ -0,0 +1,225 @@
+"""Tests for the follow cache and rate limiter."""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import instagram_follower
+from instagram_follower import FollowCache, TokenBucket
+
+
+@pytest.fixture(params=["set", "bloom"])
+def index_backend(request, monkeypatch):
+    """Run cache tests against both membership index implementations."""
+    if request.param == "bloom":
+        if instagram_follower.ScalableBloomFilter is None:
+            pytest.skip("pybloom_live not installed")
+    else:
+        monkeypatch.setattr(instagram_follower, "ScalableBloomFilter", None)
+    return request.param
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / "follow_cache.json")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable wall clock for TTL checks."""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_migrates_legacy_json(cache_file, index_backend):
+    legacy = {
+        "1": {"username": "alice", "status": "followed", "source": "target",
+              "timestamp": "2024-01-01T12:00:00", "attempts": 1},
+        "2": {"username": "bob", "status": "failed", "source": "specific",
+              "timestamp": "2024-01-02T12:00:00", "attempts": 3},
+    }
+    with open(cache_file, "w") as f:
+        json.dump(legacy, f)
+
+    cache = FollowCache(cache_file)
+
+    alice = cache.get_user(1)
+    assert alice["username"] == "alice"
+    assert alice["status"] == "followed"
+    assert alice["timestamp"] == datetime(2024, 1, 1, 12).timestamp()
+    assert cache.get_user(2)["attempts"] == 3
+
+    # Followed never expires; the old failure is long past its retry window
+    assert cache.is_processed(1)
+    assert not cache.is_processed(2)
+
+    with pytest.raises(FileNotFoundError):
+        open(cache_file)
+    with open(cache_file + ".migrated") as f:
+        assert json.load(f) == legacy
+
+
+def test_adds_expires_at_column_to_old_database(tmp_path):
+    db_file = tmp_path / "follow_cache.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute(
+        "CREATE TABLE follows (user_id INTEGER PRIMARY KEY, username TEXT, "
+        "status TEXT, source TEXT, ts REAL, attempts INTEGER)"
+    )
+    conn.execute("INSERT INTO follows VALUES (1, 'alice', 'followed', '', 0, 1)")
+    conn.commit()
+    conn.close()
+
+    cache = FollowCache(str(tmp_path / "follow_cache.json"))
+
+    assert cache.is_processed(1)
+    cache.add_user(2, "bob", "failed")
+    assert cache.get_stats()["total"] == 2
+
+
+def test_add_user_upserts_and_counts_attempts(cache_file, index_backend):
+    cache = FollowCache(cache_file)
+
+    cache.add_user("42", "carol", "failed", "target")
+    cache.add_user(42, "carol", "followed", "specific")
+
+    user = cache.get_user(42)
+    assert user["username"] == "carol"
+    assert user["status"] == "followed"
+    assert user["source"] == "specific"
+    assert user["attempts"] == 2
+    assert cache.get_stats()["total"] == 1
+
+
+def test_is_processed_respects_ttl(cache_file, index_backend, clock):
+    cache = FollowCache(cache_file)
+    cache.add_user(1, "followed_user", "followed")
+    cache.add_user(2, "failed_user", "failed")
+    cache.add_user(3, "skipped_user", "skipped")
+
+    assert cache.is_processed(1)
+    assert cache.is_processed(2)
+    assert cache.is_processed(3)
+    assert not cache.is_processed(4)
+
+    clock[0] += instagram_follower.STATUS_TTL["failed"] + 1
+    assert cache.is_processed(1)
+    assert not cache.is_processed(2)
+    assert cache.is_processed(3)
+
+    clock[0] += instagram_follower.STATUS_TTL["skipped"]
+    assert cache.is_processed(1)
+    assert not cache.is_processed(3)
+
+
+def test_vacuum_drops_expired_entries(cache_file, index_backend, clock):
+    cache = FollowCache(cache_file)
+    cache.add_user(1, "followed_user", "followed")
+    cache.add_user(2, "failed_user", "failed")
+
+    cache.vacuum()
+    assert cache.get_stats()["total"] == 2
+
+    clock[0] += instagram_follower.STATUS_TTL["failed"] + 1
+    cache.vacuum()
+
+    assert cache.get_user(2) is None
+    assert cache.get_user(1) is not None
+    assert cache.get_stats() == {
+        "total": 1, "followed": 1, "failed": 0, "skipped": 0, "already_following": 0
+    }
+
+
+def test_clear_failed(cache_file, index_backend):
+    cache = FollowCache(cache_file)
+    cache.add_user(1, "followed_user", "followed")
+    cache.add_user(2, "failed_user", "failed")
+    cache.add_user(3, "other_failure", "failed")
+    assert cache.is_processed(2)
+
+    cache.clear_failed()
+
+    assert not cache.is_processed(2)
+    assert not cache.is_processed(3)
+    assert cache.is_processed(1)
+    assert cache.get_stats()["failed"] == 0
+    assert cache.get_stats()["total"] == 1
+
+
+def test_writes_are_committed_on_close(cache_file, index_backend):
+    cache = FollowCache(cache_file)
+    cache.add_user(1, "alice", "followed")
+
+    cache._close()
+
+    conn = sqlite3.connect(cache.db_file)
+    assert conn.execute("SELECT username FROM follows").fetchall() == [("alice",)]
+
+
+class FakeClock:
+    """Monotonic clock whose sleep() advances time instead of blocking."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+        self._real_sleep = time.sleep
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # Background cache flushers from other tests keep really sleeping
+        if threading.current_thread() is not threading.main_thread():
+            self._real_sleep(seconds)
+            return
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(time, "sleep", fake.sleep)
+    return fake
+
+
+def test_token_bucket_allows_burst_then_waits(fake_clock):
+    bucket = TokenBucket(capacity=3, rate=0.5)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert fake_clock.sleeps == []
+
+    bucket.acquire()
+    assert fake_clock.sleeps == [pytest.approx(2.0)]
+
+
+def test_token_bucket_refills_over_time(fake_clock):
+    bucket = TokenBucket(capacity=2, rate=1.0)
+    bucket.acquire()
+    bucket.acquire()
+
+    fake_clock.now += 1.5
+    bucket.acquire()
+    assert fake_clock.sleeps == []
+
+    # Half a token left; the next one needs another 0.5s
+    bucket.acquire()
+    assert fake_clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_token_bucket_never_exceeds_capacity(fake_clock):
+    bucket = TokenBucket(capacity=1, rate=1 / 30)
+    bucket.acquire()
+
+    fake_clock.now += 3600
+    bucket.acquire()
+    bucket.acquire()
+
+    assert fake_clock.sleeps == [pytest.approx(30.0)]